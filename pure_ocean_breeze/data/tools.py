@@ -10,6 +10,7 @@ import tqdm.auto
 import datetime
 import scipy.io as scio
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import numpy_ext as npext
 import knockknock as kk
 import scipy.stats as ss
@@ -17,22 +18,38 @@ from functools import reduce, partial
 from loguru import logger
 from typing import Callable, Union, Dict, List, Tuple
 
-try:
-    import rqdatac
-
-    rqdatac.init()
-except Exception:
-    print("暂时未连接米筐")
 from pure_ocean_breeze.state.homeplace import HomePlace
 import deprecation
 from pure_ocean_breeze import __version__
 from pure_ocean_breeze.state.decorators import do_on_dfs
+from pure_ocean_breeze.data.dicts import INDUS_DICT
 
 try:
     homeplace = HomePlace()
 except Exception:
     print("您暂未初始化，功能将受限")
 
+_rq_inited = False
+
+
+def _ensure_rq():
+    """首次用到米筐时再连接，避免每次import都要联网初始化"""
+    global _rq_inited
+    import rqdatac
+
+    if not _rq_inited:
+        rqdatac.init()
+        _rq_inited = True
+    return rqdatac
+
+
+# 需要在import时就连接米筐的，可以设置环境变量PUREOB_INIT_RQDATAC=1
+if os.environ.get("PUREOB_INIT_RQDATAC") == "1":
+    try:
+        _ensure_rq()
+    except Exception:
+        print("暂时未连接米筐")
+
 
 def is_notebook() -> bool:
     try:
@@ -48,7 +65,7 @@ def is_notebook() -> bool:
 
 
 @do_on_dfs
-def read_mat(path: str) -> pd.DataFrame:
+def read_mat(path: str) -> np.ndarray:
     """读取mat文件
 
     Parameters
@@ -58,10 +75,11 @@ def read_mat(path: str) -> pd.DataFrame:
 
     Returns
     -------
-    `pd.DataFrame`
-        字典的第4个value
+    `np.ndarray`
+        mat文件中的第一个变量
     """
-    return list(scio.loadmat(path).values())[3]
+    names = [i[0] for i in scio.whosmat(path) if not i[0].startswith("__")]
+    return scio.loadmat(path, variable_names=names[:1])[names[0]]
 
 
 @do_on_dfs
@@ -98,6 +116,37 @@ def convert_code(x: str) -> Tuple[str, str]:
     return x, kind
 
 
+def convert_codes(codes: Union[pd.Series, list]) -> Tuple[pd.Series, pd.Series]:
+    """convert_code的批量版本，一次性转换一组米筐/wind代码，并识别它们是股票还是指数
+
+    Parameters
+    ----------
+    codes : Union[pd.Series, list]
+        多个米筐的股票/指数代码，以 XSHE 或 XSHG 结尾
+
+    Returns
+    -------
+    `Tuple[pd.Series,pd.Series]`
+        转换后的股票/指数代码，以及每个代码属于股票还是指数
+    """
+    codes = pd.Series(codes)
+    parts = codes.astype(str).str.split("/").str[-1].str.split(".")
+    # 与convert_code一致，缺少后缀或代码部分为空时直接报错，避免转换成nan
+    bad = (parts.str.len() < 2) | (parts.str[0] == "")
+    if bad.any():
+        raise IndexError(f"以下代码无法转换：{codes[bad].tolist()}")
+    x1 = parts.str[0]
+    x2 = parts.str[1]
+    x2 = x2.map({"XSHE": ".SZ", "XSHG": ".SH", "SZ": ".XSHE", "SH": ".XSHG"}).fillna(
+        x2
+    )
+    is_stock = (
+        ((x1.str[0] == "0") | (x1.str[:2] == "30")) & x2.isin([".SZ", ".XSHE"])
+    ) | ((x1.str[0] == "6") & x2.isin([".SH", ".XSHG"]))
+    kinds = pd.Series(np.where(is_stock, "stock", "index"), index=x1.index)
+    return x1 + x2, kinds
+
+
 @do_on_dfs
 def add_suffix(code:str)->str:
     """给股票代码加上后缀
@@ -142,13 +191,37 @@ def get_value(df: pd.DataFrame, n: int) -> pd.DataFrame:
         仅有第n个值构成的pd.DataFrame
     """
 
-    def get_value_single(x, n):
+    def get_value_single(x):
         try:
             return x[n]
         except Exception:
             return np.nan
 
-    df = df.applymap(lambda x: get_value_single(x, n))
+    # 绝大多数value是列表、元组或nan，先按浮点数直接取出，其余类型仍按原来的方式取值
+    k = n if n >= 0 else -n - 1
+    seqs = (list, tuple, np.ndarray)
+    nan = np.nan
+    arr = df.to_numpy(dtype=object, copy=False).ravel()
+    try:
+        values = np.fromiter(
+            (
+                x[n]
+                if isinstance(x, seqs) and len(x) > k
+                else nan
+                if isinstance(x, float)
+                else get_value_single(x)
+                for x in arr
+            ),
+            dtype=float,
+            count=arr.size,
+        )
+    except (TypeError, ValueError):
+        values = np.empty(arr.size, dtype=object)
+        for i, x in enumerate(arr):
+            values[i] = get_value_single(x)
+    df = pd.DataFrame(
+        values.reshape(df.shape), index=df.index, columns=df.columns
+    ).infer_objects()
     return df
 
 
@@ -168,87 +241,13 @@ def indus_name(df: pd.DataFrame, col_name: str = None) -> pd.DataFrame:
     `pd.DataFrame`
         转化后的pd.DataFrame
     """
-    names = pd.DataFrame(
-        {
-            "indus_we_cant_same": [
-                "801170.SI",
-                "801010.SI",
-                "801140.SI",
-                "801080.SI",
-                "801780.SI",
-                "801110.SI",
-                "801230.SI",
-                "801950.SI",
-                "801180.SI",
-                "801040.SI",
-                "801740.SI",
-                "801890.SI",
-                "801770.SI",
-                "801960.SI",
-                "801200.SI",
-                "801120.SI",
-                "801710.SI",
-                "801720.SI",
-                "801880.SI",
-                "801750.SI",
-                "801050.SI",
-                "801790.SI",
-                "801150.SI",
-                "801980.SI",
-                "801030.SI",
-                "801730.SI",
-                "801160.SI",
-                "801130.SI",
-                "801210.SI",
-                "801970.SI",
-                "801760.SI",
-            ],
-            "行业名称": [
-                "交通运输",
-                "农林牧渔",
-                "轻工制造",
-                "电子",
-                "银行",
-                "家用电器",
-                "综合",
-                "煤炭",
-                "房地产",
-                "钢铁",
-                "国防军工",
-                "机械设备",
-                "通信",
-                "石油石化",
-                "商贸零售",
-                "食品饮料",
-                "建筑材料",
-                "建筑装饰",
-                "汽车",
-                "计算机",
-                "有色金属",
-                "非银金融",
-                "医药生物",
-                "美容护理",
-                "基础化工",
-                "电力设备",
-                "公用事业",
-                "纺织服饰",
-                "社会服务",
-                "环保",
-                "传媒",
-            ],
-        }
-    ).sort_values(["indus_we_cant_same"])
     if col_name:
-        names = names.rename(columns={"indus_we_cant_same": col_name})
-        df = pd.merge(df, names, on=[col_name])
+        df = df[df[col_name].isin(INDUS_DICT.keys())]
+        df = df.assign(行业名称=df[col_name].map(INDUS_DICT)).reset_index(drop=True)
     else:
-        df = df.reset_index()
-        df = df.rename(columns={list(df.columns)[0]: "indus_we_cant_same"})
-        df = (
-            pd.merge(df, names, on=["indus_we_cant_same"])
-            .set_index("行业名称")
-            .drop(columns=["indus_we_cant_same"])
-        )
+        df = df[df.index.isin(INDUS_DICT.keys())]
+        df.index = df.index.map(INDUS_DICT)
+        df.index.name = "行业名称"
     return df
 
 
@@ -260,6 +259,7 @@ def rqdatac_show_used() -> float:
     `float`
         当日已经使用的流量MB数
     """
+    rqdatac = _ensure_rq()
     user2 = round(rqdatac.user.get_quota()["bytes_used"] / 1024 / 1024, 2)
     print(f"今日已使用rqsdk流量{user2}MB")
     return user2
@@ -290,6 +290,29 @@ def add_suffix(code: str) -> str:
     return code
 
 
+def add_suffixes(codes: Union[pd.Series, list]) -> pd.Series:
+    """add_suffix的批量版本，一次性给一组没有后缀的股票代码加上wind后缀
+
+    Parameters
+    ----------
+    codes : Union[pd.Series, list]
+        多个没有后缀的股票代码
+
+    Returns
+    -------
+    `pd.Series`
+        加完wind后缀的股票代码
+    """
+    codes = pd.Series(codes).astype(str)
+    first = codes.str[0]
+    suffix = np.select(
+        [first.isin(["0", "3"]), first == "6", first == "8"],
+        [".SZ", ".SH", ".BJ"],
+        default=".UN",
+    )
+    return codes + suffix
+
+
 
 
 @do_on_dfs
@@ -318,18 +341,26 @@ def 生成每日分类表(
             df[exit] = df[exit].astype(int).astype(str)
     except Exception:
         print("您的进入日期和推出日期，既不是字符串，又不是数字格式，好好检查一下吧")
-    df = df.set_index([code, kind])
-    df = df.stack().to_frame(name="date")
-
-    def fill_middle(df1):
-        min_time = df1.date.min()
-        max_time = df1.date.max()
-        df2 = pd.DataFrame({"date": pd.date_range(min_time, max_time)})
-        return df2
-
-    ff = df.reset_index().groupby([code, kind]).apply(fill_middle)
-    ff = ff.reset_index()
-    ff = ff[[code, kind, "date"]]
+    df[entry] = pd.to_datetime(df[entry])
+    df[exit] = pd.to_datetime(df[exit])
+    groups = df.groupby([code, kind])[[entry, exit]]
+    spans = pd.DataFrame(
+        {"min": groups.min().min(axis=1), "max": groups.max().max(axis=1)}
+    )
+    # 只生成一次完整的日期序列，每组的日期都是其中连续的一段，依据起止位置一次性取出
+    all_days = pd.date_range(spans["min"].min(), spans["max"].max())
+    starts = all_days.searchsorted(spans["min"])
+    lengths = all_days.searchsorted(spans["max"], side="right") - starts
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    ff = pd.DataFrame(
+        {
+            code: np.repeat(spans.index.get_level_values(code), lengths),
+            kind: np.repeat(spans.index.get_level_values(kind), lengths),
+            "date": all_days[np.repeat(starts, lengths) + offsets],
+        }
+    )
     ff = ff[ff.date >= pd.Timestamp("2004-01-01")]
     return ff
 
@@ -368,18 +399,50 @@ def merge_many(
     Returns
     -------
     pd.DataFrame
-        拼接后的dataframe
+        拼接后的dataframe，date和code为普通的列而非index，便于直接依据这两列继续merge，
+        确实需要以它们为index时，再自行set_index(["date", "code"])
     """
     num = len(dfs)
     if names is None:
         names = [f"fac{i+1}" for i in range(num)]
-    dfs = [i.stack().reset_index() for i in dfs]
-    dfs = [i.rename(columns={list(i.columns)[-1]: j}) for i, j in zip(dfs, names)]
-    dfs = [
-        i.rename(columns={list(i.columns)[-2]: "code", list(i.columns)[0]: "date"})
-        for i in dfs
-    ]
-    df = reduce(lambda x, y: pd.merge(x, y, on=["date", "code"], how=how), dfs)
+    if not all(i.index.is_unique and i.columns.is_unique for i in dfs):
+        # 有重复的日期或股票代码时无法对齐，仍逐个merge
+        dfs = [i.stack().reset_index() for i in dfs]
+        dfs = [i.rename(columns={list(i.columns)[-1]: j}) for i, j in zip(dfs, names)]
+        dfs = [
+            i.rename(columns={list(i.columns)[-2]: "code", list(i.columns)[0]: "date"})
+            for i in dfs
+        ]
+        return reduce(lambda x, y: pd.merge(x, y, on=["date", "code"], how=how), dfs)
+    if how == "inner":
+        index = reduce(lambda x, y: x.intersection(y), [i.index for i in dfs])
+        columns = reduce(lambda x, y: x.intersection(y), [i.columns for i in dfs])
+    else:
+        index = reduce(lambda x, y: x.union(y), [i.index for i in dfs])
+        columns = reduce(lambda x, y: x.union(y), [i.columns for i in dfs])
+    values = np.stack(
+        [i.reindex(index=index, columns=columns).to_numpy() for i in dfs], axis=-1
+    ).reshape(-1, num)
+    not_nan = ~pd.isna(values)
+    if how == "inner":
+        keep = not_nan.all(axis=1)
+    elif how == "left":
+        keep = not_nan[:, 0]
+    elif how == "right":
+        keep = not_nan[:, -1]
+        # 逐个right merge时，前面的因子只在之后每个宽表都有这个值时才保留
+        if values.dtype.kind in "biu":
+            values = values.astype(float)
+        values[~np.logical_and.accumulate(not_nan[:, ::-1], axis=1)[:, ::-1]] = np.nan
+    else:
+        keep = not_nan.any(axis=1)
+    df = pd.DataFrame(
+        values[keep],
+        index=pd.MultiIndex.from_product([index, columns], names=["date", "code"])[
+            keep
+        ],
+        columns=names,
+    ).reset_index()
     return df
 
 
@@ -713,7 +776,7 @@ def corr_two_daily(
     rolling_window : int, optional
         滚动窗口, by default 20
     n_jobs : int, optional
-        并行数量, by default 1
+        并行数量，仅在daily为1且method为spearman时使用，其余情况下不起作用, by default 1
     daily : bool, optional
         是否每天计算, by default 1
     method : str, optional
@@ -726,22 +789,22 @@ def corr_two_daily(
     """
     if daily:
         if method == "pearson":
-
-            def corr_in(a, b, c):
-                return c.iloc[-1], np.corrcoef(a, b)[0, 1]
-
-            return func_two_daily(
+            return _two_daily_with_history(
                 df1=df1,
                 df2=df2,
-                func=corr_in,
+                calc=partial(_rolling_corr_two_daily, rolling_window=rolling_window),
                 history=history,
                 rolling_window=rolling_window,
-                n_jobs=n_jobs,
             )
         elif method == "spearman":
 
             def corr_in(a, b, c):
-                return c.iloc[-1], np.corrcoef(np.argsort(a), np.argsort(b))[0, 1]
+                a = np.asarray(np.argsort(a), dtype=float)
+                b = np.asarray(np.argsort(b), dtype=float)
+                a = a - a.mean()
+                b = b - b.mean()
+                den = np.sqrt((a @ a) * (b @ b))
+                return c.iloc[-1], (a @ b) / den if den else np.nan
 
             return func_two_daily(
                 df1=df1,
@@ -797,7 +860,7 @@ def cov_two_daily(
     rolling_window : int, optional
         滚动窗口, by default 20
     n_jobs : int, optional
-        并行数量, by default 1
+        已不再使用，仅为兼容保留, by default 1
     daily : bool, optional
         是否每天计算, by default 1
 
@@ -807,17 +870,12 @@ def cov_two_daily(
         求协方差后的结果，index为时间，columns为股票代码
     """
     if daily:
-
-        def cov_in(a, b, c):
-            return c.iloc[-1], np.cov(a, b)[0, 1]
-
-        return func_two_daily(
+        return _two_daily_with_history(
             df1=df1,
             df2=df2,
-            func=cov_in,
+            calc=partial(_rolling_corr_two_daily, rolling_window=rolling_window, cov=1),
             history=history,
             rolling_window=rolling_window,
-            n_jobs=n_jobs,
         )
     else:
 
@@ -830,15 +888,102 @@ def cov_two_daily(
         return cut()
 
 
-def func_two_daily(
+def _rolling_corr(
+    a: np.ndarray, b: np.ndarray, window: int, cov: bool = 0
+) -> np.ndarray:
+    """沿第0维，对两组数滚动计算窗口内的皮尔逊相关系数（或样本协方差）
+    每个窗口内先减去窗口自身的均值再求和，窗口内有缺失值时结果为nan
+
+    Parameters
+    ----------
+    a : np.ndarray
+        第一组数，一维或二维（每列为一只股票）
+    b : np.ndarray
+        第二组数，形状与a相同
+    window : int
+        滚动窗口
+    cov : bool, optional
+        是否改为计算样本协方差, by default 0
+
+    Returns
+    -------
+    np.ndarray
+        与a形状相同的相关系数（或协方差），前window-1个位置为nan
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    res = np.full(a.shape, np.nan)
+    if a.shape[0] < window:
+        return res
+    nan = np.isnan(a) | np.isnan(b)
+    a = np.where(nan, 0, a)
+    b = np.where(nan, 0, b)
+    # 缺失值个数是整数，用累加和相减得到每个窗口内的个数没有精度问题
+    nan_num = np.cumsum(nan, axis=0)
+    nan_num = np.concatenate([np.zeros_like(nan_num[:1]), nan_num])
+    has_nan = (nan_num[window:] - nan_num[:-window]) > 0
+    out = np.empty(has_nan.shape)
+    # 分段展开窗口，每段约4M个数，避免一次性展开全部窗口占用过多内存
+    step = max(1, 2**22 // (window * max(a.size // a.shape[0], 1)))
+    for start in range(0, out.shape[0], step):
+        x = sliding_window_view(a[start : start + step + window - 1], window, axis=0)
+        y = sliding_window_view(b[start : start + step + window - 1], window, axis=0)
+        constant = (np.ptp(x, axis=-1) == 0) | (np.ptp(y, axis=-1) == 0)
+        x = x - x.mean(axis=-1, keepdims=True)
+        y = y - y.mean(axis=-1, keepdims=True)
+        sxy = np.einsum("...i,...i->...", x, y)
+        if cov:
+            out[start : start + step] = sxy / (window - 1)
+            continue
+        sxx = np.einsum("...i,...i->...", x, x)
+        syy = np.einsum("...i,...i->...", y, y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = np.clip(sxy / np.sqrt(sxx * syy), -1, 1)
+        corr[constant] = np.nan
+        out[start : start + step] = corr
+    out[has_nan] = np.nan
+    res[window - 1 :] = out
+    return res
+
+
+def _rolling_corr_two_daily(
+    df1: pd.DataFrame, df2: pd.DataFrame, rolling_window: int, cov: bool = 0
+) -> pd.DataFrame:
+    """逐只股票，跳过两个因子都为空的日期，滚动计算皮尔逊相关系数（或样本协方差）"""
+    # 只在一个因子中出现的股票算不出相关系数，直接去掉
+    columns = df1.columns.intersection(df2.columns)
+    df1, df2 = df1[columns].align(df2[columns], join="outer", axis=0)
+    df1, df2 = df1.sort_index(), df2.sort_index()
+    a = df1.to_numpy(dtype=float)
+    b = df2.to_numpy(dtype=float)
+    keep = ~(np.isnan(a) & np.isnan(b))
+    num = keep.sum(axis=0)
+    first = keep.argmax(axis=0)
+    last = a.shape[0] - 1 - keep[::-1].argmax(axis=0)
+    # 两个因子同时为空的日期只出现在首尾（如上市前、退市后）的股票，跳过这些日期与否结果相同，
+    # 可以直接在整个二维数组上一次算完，中间有空缺的股票才需要逐只剔除空缺后再算
+    whole = (num > rolling_window) & (num == last - first + 1)
+    res = np.full(a.shape, np.nan)
+    res[:, whole] = _rolling_corr(a[:, whole], b[:, whole], rolling_window, cov)
+    for i in np.flatnonzero((num > rolling_window) & ~whole):
+        res[keep[:, i], i] = _rolling_corr(
+            a[keep[:, i], i], b[keep[:, i], i], rolling_window, cov
+        )
+    cors = pd.DataFrame(res, index=df1.index, columns=df1.columns)
+    cors = cors.dropna(how="all").dropna(how="all", axis=1)
+    cors.index.name = "date"
+    cors.columns.name = "code"
+    return cors
+
+
+def _two_daily_with_history(
     df1: pd.DataFrame,
     df2: pd.DataFrame,
-    func: Callable,
+    calc: Callable,
     history: str = None,
     rolling_window: int = 20,
-    n_jobs: int = 1,
 ) -> pd.DataFrame:
-    """求两个因子，在相同股票上，时序上滚动窗口下的相关系数
+    """对两个因子做滚动计算，并依照history读取和更新本地的历史文件
 
     Parameters
     ----------
@@ -846,33 +991,20 @@ def func_two_daily(
         第一个因子，index为时间，columns为股票代码
     df2 : pd.DataFrame
         第二个因子，index为时间，columns为股票代码
-    func : Callable
-        要对两列数进行操作的函数
+    calc : Callable
+        输入df1和df2，返回计算结果的函数
     history : str, optional
         从某处读取计算好的历史文件
     rolling_window : int, optional
         滚动窗口, by default 20
-    n_jobs : int, optional
-        并行数量, by default 1
 
     Returns
     -------
     pd.DataFrame
         计算后的结果，index为时间，columns为股票代码
     """
-
-    the_func = partial(func)
-
-    def func_rolling(df):
-        df = df.sort_values(["date"])
-        if df.shape[0] > rolling_window:
-            df = npext.rolling_apply(
-                the_func, rolling_window, df.fac1, df.fac2, df.date, n_jobs=n_jobs
-            )
-            return df
-
-    homeplace = HomePlace()
     if history is not None:
+        homeplace = HomePlace()
         if os.path.exists(homeplace.update_data_file + history):
             old = pd.read_parquet(homeplace.update_data_file + history)
             new_end = min(df1.index.max(), df2.index.max())
@@ -885,64 +1017,79 @@ def func_two_daily(
                 df2a = df2[df2.index <= old.index.max()].tail(rolling_window - 1)
                 df2b = df2[df2.index > old.index.max()]
                 df2 = pd.concat([df2a, df2b])
-                twins = merge_many([df1, df2])
-
-                tqdm.auto.tqdm.pandas()
-                corrs = twins.groupby(["code"]).progress_apply(func_rolling)
-                cor = []
-                for i in range(len(corrs)):
-                    df = (
-                        pd.DataFrame(corrs.iloc[i]).dropna().assign(code=corrs.index[i])
-                    )
-                    cor.append(df)
-                cors = pd.concat(cor)
-                cors.columns = ["date", "corr", "code"]
-                cors = cors.pivot(index="date", columns="code", values="corr")
-                if history is not None:
-                    if os.path.exists(homeplace.update_data_file + history):
-                        cors = pd.concat([old, cors])
-                    cors = drop_duplicates_index(cors)
-                    cors.to_parquet(homeplace.update_data_file + history)
-                    new_end = datetime.datetime.strftime(cors.index.max(), "%Y%m%d")
-                    logger.info(f"已经更新至{new_end}")
-                return cors
+                cors = pd.concat([old, calc(df1, df2)])
             else:
                 logger.info(f"已经是最新的了")
                 return old
         else:
             logger.info("第一次计算，请耐心等待，计算完成后将存储")
-            twins = merge_many([df1, df2])
-            tqdm.auto.tqdm.pandas()
-            corrs = twins.groupby(["code"]).progress_apply(func_rolling)
-            cor = []
-            for i in range(len(corrs)):
-                df = pd.DataFrame(corrs.iloc[i]).dropna().assign(code=corrs.index[i])
-                cor.append(df)
-            cors = pd.concat(cor)
-            cors.columns = ["date", "corr", "code"]
-            cors = cors.pivot(index="date", columns="code", values="corr")
-            if history is not None:
-                if os.path.exists(homeplace.update_data_file + history):
-                    cors = pd.concat([old, cors])
-                cors = drop_duplicates_index(cors)
-                cors.to_parquet(homeplace.update_data_file + history)
-                new_end = datetime.datetime.strftime(cors.index.max(), "%Y%m%d")
-                logger.info(f"已经更新至{new_end}")
-            return cors
+            cors = calc(df1, df2)
+        cors = drop_duplicates_index(cors)
+        cors.to_parquet(homeplace.update_data_file + history)
+        new_end = datetime.datetime.strftime(cors.index.max(), "%Y%m%d")
+        logger.info(f"已经更新至{new_end}")
+        return cors
     else:
         logger.warning("您本次计算没有指定任何本地文件路径，这很可能会导致大量的重复计算和不必要的时间浪费，请注意！")
+        return calc(df1, df2)
+
+
+def func_two_daily(
+    df1: pd.DataFrame,
+    df2: pd.DataFrame,
+    func: Callable,
+    history: str = None,
+    rolling_window: int = 20,
+    n_jobs: int = 1,
+) -> pd.DataFrame:
+    """求两个因子，在相同股票上，时序上滚动窗口下的相关系数
+
+    Parameters
+    ----------
+    df1 : pd.DataFrame
+        第一个因子，index为时间，columns为股票代码
+    df2 : pd.DataFrame
+        第二个因子，index为时间，columns为股票代码
+    func : Callable
+        要对两列数进行操作的函数
+    history : str, optional
+        从某处读取计算好的历史文件
+    rolling_window : int, optional
+        滚动窗口, by default 20
+    n_jobs : int, optional
+        并行数量, by default 1
+
+    Returns
+    -------
+    pd.DataFrame
+        计算后的结果，index为时间，columns为股票代码
+    """
+
+    the_func = partial(func)
+
+    def func_rolling(df):
+        df = df.sort_values(["date"])
+        if df.shape[0] > rolling_window:
+            df = npext.rolling_apply(
+                the_func, rolling_window, df.fac1, df.fac2, df.date, n_jobs=n_jobs
+            )
+            return df
+
+    def calc(df1, df2):
         twins = merge_many([df1, df2])
         tqdm.auto.tqdm.pandas()
-        corrs = twins.groupby(["code"]).progress_apply(func_rolling)
-        cor = []
-        for i in range(len(corrs)):
-            df = pd.DataFrame(corrs.iloc[i]).dropna().assign(code=corrs.index[i])
-            cor.append(df)
-        cors = pd.concat(cor)
-        cors.columns = ["date", "corr", "code"]
+        corrs = twins.groupby(["code"]).progress_apply(func_rolling).dropna()
+        cors = pd.DataFrame(
+            np.concatenate(corrs.to_numpy()), columns=["date", "corr"]
+        ).assign(code=np.repeat(corrs.index, corrs.map(len)))
+        cors = cors.dropna()
         cors = cors.pivot(index="date", columns="code", values="corr")
         return cors
 
+    return _two_daily_with_history(
+        df1=df1, df2=df2, calc=calc, history=history, rolling_window=rolling_window
+    )
+
 
 @do_on_dfs
 def drop_duplicates_index(new: pd.DataFrame) -> pd.DataFrame:
@@ -958,22 +1105,7 @@ def drop_duplicates_index(new: pd.DataFrame) -> pd.DataFrame:
     pd.DataFrame
         去重后的dataframe
     """
-    pri_name = new.index.name
-    new = new.reset_index()
-    new = new.rename(
-        columns={
-            list(new.columns)[0]: "tmp_name_for_this_function_never_same_to_others"
-        }
-    )
-    new = new.drop_duplicates(
-        subset=["tmp_name_for_this_function_never_same_to_others"], keep="first"
-    )
-    new = new.set_index("tmp_name_for_this_function_never_same_to_others")
-    if pri_name == "tmp_name_for_this_function_never_same_to_others":
-        new.index.name = "date"
-    else:
-        new.index.name = pri_name
-    return new
+    return new[~new.index.duplicated(keep="first")]
 
 
 def select_max(df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
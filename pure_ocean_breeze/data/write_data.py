@@ -1,43 +1,5 @@
 __updated__ = "2023-08-07 10:47:39"
 
-import time
-
-try:
-    import rqdatac
-
-    rqdatac.init()
-except Exception as e:
-    print(e)
-    desicion = input("米筐连接暂时有错误，是否等待并继续连接，等待请输入y，不等待则输入n")
-    if desicion == "y":
-        print("连接米筐暂时有错误，将等待30秒后重试")
-        time.sleep(30)
-        try:
-            import rqdatac
-
-            rqdatac.init()
-        except Exception as e:
-            print(e)
-            print("连接米筐暂时有错误，将等待60秒后重试")
-            time.sleep(60)
-            try:
-                import rqdatac
-
-                rqdatac.init()
-            except Exception as e:
-                print(e)
-                print("连接米筐暂时有错误，将等待60秒后重试")
-                time.sleep(60)
-                try:
-                    import rqdatac
-
-                    rqdatac.init()
-                except Exception as e:
-                    print(e)
-                    print("暂时未连接米筐")
-    else:
-        print("暂时未连接米筐")
-
 from loguru import logger
 import os
 import time
@@ -88,9 +50,12 @@ from pure_ocean_breeze.data.dicts import INDUS_DICT, INDEX_DICT, ZXINDUS_DICT
 from pure_ocean_breeze.data.tools import (
     生成每日分类表,
     add_suffix,
+    add_suffixes,
     convert_code,
+    convert_codes,
     drop_duplicates_index,
     select_max,
+    _ensure_rq,
 )
 from pure_ocean_breeze.labor.process import pure_fama
 
@@ -204,6 +169,7 @@ def database_update_minute_data_to_clickhouse_and_questdb(
         code_type = "INDX"
     else:
         raise IOError("总得指定一种类型吧？请从stock和index中选一个")
+    rqdatac = _ensure_rq()
     # 获取剩余使用额
     user1 = round(rqdatac.user.get_quota()["bytes_used"] / 1024 / 1024, 2)
     logger.info(f"今日已使用rqsdk流量{user1}MB")
@@ -291,6 +257,7 @@ def database_update_minute_data_to_questdb(kind: str, web_port: str = "9001") ->
         code_type = "INDX"
     else:
         raise IOError("总得指定一种类型吧？请从stock和index中选一个")
+    rqdatac = _ensure_rq()
     # 获取剩余使用额
     user1 = round(rqdatac.user.get_quota()["bytes_used"] / 1024 / 1024, 2)
     logger.info(f"今日已使用rqsdk流量{user1}MB")
@@ -780,7 +747,7 @@ def database_update_barra_files_dcube():
                 }
             )
             style.date = pd.to_datetime(style.date, format="%Y%m%d")
-            style.code = style.code.apply(add_suffix)
+            style.code = add_suffixes(style.code)
             sts = list(style.columns)[2:]
             for s in sts:
                 ds[s].append(style.pivot(columns="code", index="date", values=s))
@@ -795,6 +762,7 @@ def database_update_barra_files_dcube():
 
 
 def database_update_barra_files():
+    rqdatac = _ensure_rq()
     fs = os.listdir(homeplace.barra_data_file)[0]
     fs = pd.read_parquet(homeplace.barra_data_file + fs)
     last_date = fs.index.max()
@@ -820,7 +788,7 @@ def database_update_barra_files():
     ]
     ds = {k: [] for k in style_names}
     if len(tradedates) >= 1:
-        codes = [convert_code(i)[0] for i in list(read_daily(open=1).columns)]
+        codes = list(convert_codes(read_daily(open=1).columns)[0])
         style = rqdatac.get_factor_exposure(
             order_book_ids=codes,
             start_date=pd.Timestamp(last_date) + pd.Timedelta(days=1),
@@ -839,7 +807,7 @@ def database_update_barra_files():
         )
         style = style[style_names + ["date", "code"]]
         style.date = pd.to_datetime(style.date)
-        style.code = style.code.apply(lambda x: convert_code(x)[0])
+        style.code = convert_codes(style.code)[0]
         for s in style_names:
             ds[s].append(style.pivot(columns="code", index="date", values=s))
         for k, v in ds.items():
@@ -943,6 +911,7 @@ def database_update_swindustry_prices():
 
 
 def database_update_zxindustry_prices():
+    rqdatac = _ensure_rq()
     zxinds = ZXINDUS_DICT
     now = datetime.datetime.now()
     zxprices = []
@@ -1080,6 +1049,7 @@ def database_update_index_members_monthly():
 
 
 def download_single_index_member(code):
+    rqdatac = _ensure_rq()
     file = homeplace.daily_data_file + INDEX_DICT[code] + "日成分股.parquet"
     if code.endswith(".SH"):
         code = code[:6] + ".XSHG"
@@ -1094,7 +1064,7 @@ def download_single_index_member(code):
         res = pd.DataFrame(1, index=[pd.Timestamp(k)], columns=v)
         ress.append(res)
     ress = pd.concat(ress)
-    ress.columns = [convert_code(i)[0] for i in list(ress.columns)]
+    ress.columns = list(convert_codes(ress.columns)[0])
     tr = np.sign(read_daily(tr=1, start=20100101))
     tr = np.sign(tr + ress)
     now_str = datetime.datetime.strftime(now, "%Y%m%d")
@@ -1206,6 +1176,7 @@ def database_update_money_flow():
 
 def database_update_zxindustry_member():
     """更新中信一级行业的成分股"""
+    rqdatac = _ensure_rq()
     old_codes = pd.read_parquet(homeplace.daily_data_file + "中信一级行业哑变量代码版.parquet")
     old_names = pd.read_parquet(homeplace.daily_data_file + "中信一级行业哑变量名称版.parquet")
     old_enddate = old_codes.date.max()
@@ -1255,7 +1226,7 @@ def database_update_zxindustry_member():
         def save(df, old, file):
             df = df.rename(columns={"order_book_id": "code"})
             df = df[["date", "code"] + sorted(list(df.columns)[1:-1])]
-            df.code = df.code.apply(lambda x: convert_code(x)[0])
+            df.code = convert_codes(df.code)[0]
             df = pd.concat([old, df], ignore_index=True)
             df = df[df.date.isin(list(a.index))]
             df=df.reset_index(drop=True).replace(True,1).replace(False,0)
@@ -1435,6 +1406,7 @@ class FactorReader:
 
 
 def database_update_index_weight():
+    rqdatac = _ensure_rq()
     opens = read_daily(open=1).resample("M").last()
     dates = [datetime.datetime.strftime(i, "%Y%m%d") for i in list(opens.index)]
     df1s = []
@@ -1457,7 +1429,7 @@ def database_update_index_weight():
     def deal(df):
         df = pd.concat(df, axis=1).T
         df.index = pd.to_datetime(df.index)
-        df.columns = [convert_code(i)[0] for i in df.columns]
+        df.columns = list(convert_codes(df.columns)[0])
         return df
 
     df1, df2, df3 = list(map(deal, [df1s, df2s, df3s]))
@@ -43,12 +43,16 @@ def read_h5(path: str) -> dict:
     res = {}
     import h5py
 
-    a = h5py.File(path)
-    for k, v in tqdm.tqdm(list(a.items()), desc="数据加载中……"):
-        value = list(v.values())[-1]
-        col = [i.decode("utf-8") for i in list(list(v.values())[0])]
-        ind = [i.decode("utf-8") for i in list(list(v.values())[1])]
-        res[k] = pd.DataFrame(value, columns=col, index=ind)
+    # 默认的chunk缓存只有1MB，大块数据会被反复挤出、重复读取
+    # h5py的所有调用都在同一把全局锁下进行，多线程并不能让各组数据并发读取，因此仍逐组读取
+    with h5py.File(
+        path, "r", rdcc_nbytes=256 * 1024 * 1024, rdcc_nslots=1_000_003
+    ) as a:
+        for k, v in tqdm.tqdm(a.items(), total=len(a), desc="数据加载中……"):
+            items = list(v.values())
+            col = np.char.decode(items[0][:].astype(bytes), "utf-8")
+            ind = np.char.decode(items[1][:].astype(bytes), "utf-8")
+            res[k] = pd.DataFrame(items[-1][:], columns=col, index=ind)
     return res
 
 
@@ -70,7 +74,47 @@ def read_h5_new(path: str) -> pd.DataFrame:
     a = h5py.File(path)
     v = list(a.values())[0]
     v = a[v.name][:]
-    return pd.DataFrame(v)
+    if v.dtype.names:
+        # 数值字段直接用视图，字节串、字符串等字段与pd.DataFrame(v)一样转为object
+        return pd.DataFrame(
+            {
+                i: v[i].astype(object) if v.dtype[i].kind in "OSUV" else v[i]
+                for i in v.dtype.names
+            },
+            copy=False,
+        )
+    return pd.DataFrame(v, copy=False)
+
+
+def read_h5_or_feather(path: str) -> pd.DataFrame:
+    """读取h5文件，并在同目录下存一份同名的feather文件，此后优先读取feather文件
+
+    Parameters
+    ----------
+    path : str
+        h5文件路径
+
+    Returns
+    -------
+    `pd.DataFrame`
+        与read_h5_new的结果相同
+    """
+    feather_path = os.path.splitext(path)[0] + ".feather"
+    if os.path.exists(feather_path) and os.path.getmtime(
+        feather_path
+    ) >= os.path.getmtime(path):
+        return pd.read_feather(feather_path)
+    df = read_h5_new(path)
+    # feather只能存储默认的index和字符串类型的列名
+    if all(isinstance(i, str) for i in df.columns):
+        # 定长的字节串和字符串列统一转为object，使首次读取与之后读取feather的结果一致
+        df = df.astype({i: object for i in df.columns if df[i].dtype.kind in "SU"})
+        try:
+            df.to_feather(feather_path)
+        except Exception:
+            if os.path.exists(feather_path):
+                os.remove(feather_path)
+    return df
 
 
 def read_mat(path: str) -> pd.DataFrame:
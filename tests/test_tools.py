@@ -0,0 +1,42 @@
+import numpy as np
+
+from pure_ocean_breeze.data.tools import _rolling_corr
+
+
+def corrcoef_rolling(a, b, window):
+    res = np.full(a.shape, np.nan)
+    for i in range(window - 1, a.shape[0]):
+        part = slice(i - window + 1, i + 1)
+        res[i] = np.corrcoef(a[part], b[part])[0, 1]
+    return res
+
+
+def test_rolling_corr_wide_range_series():
+    rng = np.random.default_rng(0)
+    n = 4500
+    a = np.geomspace(1e5, 1e11, n) * (1 + 0.01 * rng.normal(size=n))
+    b = rng.normal(size=n) + np.linspace(0, 1, n)
+    res = _rolling_corr(a, b, 20)
+    expected = corrcoef_rolling(a, b, 20)
+    assert (np.isnan(res) == np.isnan(expected)).all()
+    assert np.nanmax(np.abs(res - expected)) < 1e-10
+
+
+def test_rolling_corr_constant_window_is_nan():
+    rng = np.random.default_rng(1)
+    a = rng.normal(size=200)
+    a[100:130] = a.mean()
+    res = _rolling_corr(a, rng.normal(size=200), 20)
+    assert np.isnan(res[119:130]).all()
+    assert not np.isnan(res[140:]).any()
+
+
+def test_rolling_corr_nan_and_cov():
+    rng = np.random.default_rng(2)
+    a = rng.normal(size=(100, 3)) * 1e6
+    b = rng.normal(size=(100, 3))
+    a[50, 1] = np.nan
+    res = _rolling_corr(a, b, 20, cov=1)
+    assert np.isnan(res[50:70, 1]).all()
+    expected = np.cov(a[70:90, 1], b[70:90, 1])[0, 1]
+    assert np.isclose(res[89, 1], expected)